@@ -1,12 +1,24 @@
 import os
 from dotenv import load_dotenv
 from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.lite_llm import LiteLlm, LiteLLMClient
 from .retrieve_knowledge_tool import query_knowledge_base
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Common queries embedded (and retrieved) at CLI startup so the first questions of a session hit the cache.
+# One query per line; blank lines and lines starting with '#' are ignored.
+WARMUP_QUERIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warmup_queries.txt")
+
+def _load_warmup_queries(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+WARMUP_QUERIES = _load_warmup_queries(WARMUP_QUERIES_FILE)
+
 # 1. Configure LiteLLM
 # Get the API key from environment variables
 openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
@@ -17,9 +29,38 @@ if not openrouter_api_key:
     # Optionally, exit or raise an error if the key is critical for operation
     # exit() # or raise ValueError("OPENROUTER_API_KEY not set")
 
+# Anthropic prompt caching: the static system prompt is marked cacheable so later calls re-read it
+# from the server-side cache. Retrieved context arrives in tool messages, outside the cache marker.
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+def _mark_system_prompt_cacheable(messages: list) -> list:
+    """Returns `messages` with the system prompt wrapped in a text block carrying an ephemeral cache_control marker."""
+    marked = []
+    for message in messages:
+        # ADK may send the instruction with the newer "developer" role; Anthropic only understands "system"
+        if message.get("role") in ("system", "developer") and isinstance(message.get("content"), str):
+            message = {
+                **message,
+                "role": "system",
+                "content": [{"type": "text", "text": message["content"], "cache_control": {"type": "ephemeral"}}]
+            }
+        marked.append(message)
+    return marked
+
+class PromptCachingLiteLLMClient(LiteLLMClient):
+    """LiteLLM client that marks the system prompt as cacheable before every completion call."""
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        return await super().acompletion(model, _mark_system_prompt_cacheable(messages), tools, **kwargs)
+
+    def completion(self, model, messages, tools, stream=False, **kwargs):
+        return super().completion(model, _mark_system_prompt_cacheable(messages), tools, stream=stream, **kwargs)
+
 llm_model = LiteLlm(
     model_name="openrouter/anthropic/claude-3-haiku-20240307", # Or your preferred model
-    api_key=openrouter_api_key
+    api_key=openrouter_api_key,
+    extra_headers=PROMPT_CACHING_HEADERS,
+    llm_client=PromptCachingLiteLLMClient()
 )
 
 # 2. Define the ADK Agent
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Define constants
+DEFAULT_CACHE_CAPACITY = 1000
+DEFAULT_CACHE_TTL_SECONDS = 3600
+# Some models (e.g. BGE) embed a query differently from a passage with the same text,
+# so CachedEmbedder keys the two kinds of vectors separately
+QUERY_KEY_PREFIX = "query:"
+DOCUMENT_KEY_PREFIX = "document:"
+
+def _hash_key(text: str) -> bytes:
+    """Returns a compact, fixed-size cache key for a piece of text."""
+    return hashlib.blake2b(text.encode("utf-8")).digest()
+
+class LRUEmbeddingCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry time-to-live.
+    Keys are blake2b digests of the input text, so long queries do not bloat the cache.
+    Used for query embeddings as well as formatted retrieval results.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CACHE_CAPACITY, ttl: float = DEFAULT_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, text: str):
+        """Returns the cached value for `text`, or None on a miss or an expired entry."""
+        key = _hash_key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, text: str, value) -> None:
+        """Stores `value` for `text`, evicting the least recently used entry when full."""
+        key = _hash_key(text)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every entry and resets the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> dict:
+        """Returns size and hit-rate counters for observability."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+class CachedEmbedder:
+    """
+    Wraps a LangChain embeddings object so repeated texts are embedded only once.
+    Exposes the same embed_query / embed_documents methods as the wrapped object, plus embed_queries.
+    Query and document vectors are cached under separate keys, so a text embedded both ways gets both vectors.
+    Queries passed to warmup() are pinned in a pre-computed layer that never expires or gets evicted.
+    """
+
+    def __init__(self, embeddings, cache: LRUEmbeddingCache = None):
+        self.embeddings = embeddings
+        self.cache = cache if cache is not None else LRUEmbeddingCache()
+        self._precomputed = {}  # query key -> vector, checked before the LRU cache
+
+    def _embed_queries_uncached(self, texts: list) -> list:
+        """Embeds queries with the wrapped model, in one batch when it provides embed_queries."""
+        embed_queries = getattr(self.embeddings, "embed_queries", None)
+        if embed_queries is not None:
+            return embed_queries(texts)
+        return [self.embeddings.embed_query(text) for text in texts]
+
+    def warmup(self, texts: list) -> None:
+        """Embeds the queries `texts` and pins the vectors in the pre-computed layer."""
+        texts = [text for text in texts if _hash_key(QUERY_KEY_PREFIX + text) not in self._precomputed]
+        if not texts:
+            return
+        vectors = self._embed_queries_uncached(texts)
+        for text, vector in zip(texts, vectors):
+            self._precomputed[_hash_key(QUERY_KEY_PREFIX + text)] = vector
+
+    def _lookup_query(self, text: str):
+        vector = self._precomputed.get(_hash_key(QUERY_KEY_PREFIX + text))
+        if vector is None:
+            vector = self.cache.get(QUERY_KEY_PREFIX + text)
+        return vector
+
+    def embed_query(self, text: str) -> list:
+        """Returns the embedding for a single query, calling the wrapped model only on a cache miss."""
+        vector = self._lookup_query(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(QUERY_KEY_PREFIX + text, vector)
+        return vector
+
+    def embed_queries(self, texts: list) -> list:
+        """Returns query embeddings for `texts` (as embed_query would), embedding only the uncached ones."""
+        vectors = [self._lookup_query(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self._embed_queries_uncached([texts[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                self.cache.put(QUERY_KEY_PREFIX + texts[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    def embed_documents(self, texts: list) -> list:
+        """Returns embeddings for `texts`, sending only the uncached ones to the wrapped model in one batch."""
+        vectors = [self.cache.get(DOCUMENT_KEY_PREFIX + text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                self.cache.put(DOCUMENT_KEY_PREFIX + texts[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    def stats(self) -> dict:
+        """Returns hit-rate counters of the underlying embedding cache and the number of pinned vectors."""
+        return {**self.cache.stats(), "precomputed": len(self._precomputed)}
@@ -0,0 +1,150 @@
+import uuid
+from functools import lru_cache
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+# Define constants
+# Chunk sizes are measured with the tokenizer of the embedding model, not in characters
+TOKENIZER_MODEL = "intfloat/e5-small-v2"
+CHUNK_MAX_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 20
+# Chunks shorter than this are merged into the previous chunk instead of being embedded on their own
+CHUNK_MIN_TOKENS = 100
+# Parent chunks give the LLM surrounding context; only their smaller children are embedded
+PARENT_CHUNK_MAX_TOKENS = 1000
+PARENT_CHUNK_OVERLAP_TOKENS = 200
+# Split on paragraphs first, then sentence punctuation, then whitespace, and as a last resort
+# between characters (long URLs, CJK text) so no chunk exceeds the token limit
+SEPARATORS = [r"\n\n", r"(?<=[.!?])\s+", r"\s+", ""]
+# Knowledge files are streamed in blocks of about this many characters, cut on paragraph boundaries
+STREAM_BLOCK_CHARS = 1_000_000
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """Loads the HuggingFace tokenizer once per process."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+
+def count_tokens(text: str) -> int:
+    """Returns the number of tokens in `text`, excluding special tokens."""
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+def iter_paragraph_blocks(path: str, block_chars: int = STREAM_BLOCK_CHARS):
+    """
+    Reads a text file incrementally and yields blocks of roughly `block_chars` characters.
+    Blocks end on a paragraph boundary ("\\n\\n") so no paragraph is split across blocks, or on a
+    line boundary ("\\n") when the buffer holds no paragraph break; a single line longer than
+    `block_chars` is yielded whole.
+    """
+    buffer = ""
+    with open(path, encoding="utf-8") as f:
+        while True:
+            data = f.read(block_chars)
+            if not data:
+                break
+            buffer += data
+            cut = buffer.rfind("\n\n")
+            if cut > 0:
+                yield buffer[:cut]
+                buffer = buffer[cut + 2:]
+                continue
+            cut = buffer.rfind("\n")
+            if cut > 0:
+                yield buffer[:cut]
+                buffer = buffer[cut + 1:]
+    if buffer.strip():
+        yield buffer
+
+def _strip_overlap(previous: str, chunk: str) -> str:
+    """Returns `chunk` without its leading copy of the end of `previous` (the splitter's overlap)."""
+    for size in range(min(len(previous), len(chunk)), 0, -1):
+        # The overlap starts on a word boundary in `previous`
+        if previous.endswith(chunk[:size]) and (size == len(previous) or previous[-size - 1].isspace()):
+            return chunk[size:]
+    return chunk
+
+def _join_chunks(previous: str, chunk: str) -> str:
+    """Joins two neighboring chunks, keeping their shared overlap only once."""
+    rest = _strip_overlap(previous, chunk)
+    if rest is chunk:
+        return f"{previous}\n{chunk}"
+    return previous + rest
+
+class TokenAwareTextSplitter:
+    """
+    Recursive paragraph -> sentence -> whitespace splitter measured in tokens.
+    After splitting, chunks under `min_tokens` are merged into a neighboring chunk when the result
+    stays within `max_tokens`, so tiny fragments do not cost an embedding call of their own.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        min_tokens: int = CHUNK_MIN_TOKENS
+    ):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self._splitter = RecursiveCharacterTextSplitter(
+            separators=SEPARATORS,
+            is_separator_regex=True,
+            chunk_size=max_tokens,
+            chunk_overlap=overlap_tokens,
+            length_function=count_tokens
+        )
+
+    def split_text(self, text: str) -> list:
+        """
+        Splits `text` into token-bounded chunks. A chunk below `min_tokens` is merged into the previous
+        chunk, or else into the next one, if the merged chunk fits in `max_tokens`; otherwise it is kept alone.
+        """
+        chunks = []
+        carry = None  # Small chunk that did not fit into the previous one, to be merged into the next
+        for chunk in self._splitter.split_text(text):
+            if carry is not None:
+                merged = _join_chunks(carry, chunk)
+                if count_tokens(merged) <= self.max_tokens:
+                    chunk = merged
+                else:
+                    chunks.append(carry)
+                carry = None
+            if count_tokens(chunk) >= self.min_tokens:
+                chunks.append(chunk)
+                continue
+            if chunks:
+                merged = _join_chunks(chunks[-1], chunk)
+                if count_tokens(merged) <= self.max_tokens:
+                    chunks[-1] = merged
+                    continue
+            carry = chunk
+        if carry is not None:
+            chunks.append(carry)
+        return chunks
+
+    def split_documents(self, documents: list) -> list:
+        """Splits each document, copying its metadata (e.g. source) onto every chunk."""
+        return [
+            Document(page_content=chunk, metadata=dict(document.metadata))
+            for document in documents
+            for chunk in self.split_text(document.page_content)
+        ]
+
+def split_parent_child(documents: list, parent_splitter=None, child_splitter=None):
+    """
+    Splits documents into large parent chunks and then each parent into small child chunks.
+    Yields only the children, one parent at a time; each carries its parent's id and text in metadata
+    ("parent_id", "parent_text") so retrieval can match on the child and return the parent.
+    """
+    if parent_splitter is None:
+        parent_splitter = TokenAwareTextSplitter(
+            max_tokens=PARENT_CHUNK_MAX_TOKENS,
+            overlap_tokens=PARENT_CHUNK_OVERLAP_TOKENS
+        )
+    if child_splitter is None:
+        child_splitter = TokenAwareTextSplitter()
+
+    for parent in parent_splitter.split_documents(documents):
+        parent_id = str(uuid.uuid4())
+        for child in child_splitter.split_documents([parent]):
+            child.metadata.update({"parent_id": parent_id, "parent_text": parent.page_content})
+            yield child
@@ -0,0 +1,79 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from .env file at module level
+load_dotenv()
+
+# Define constants
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_TIMEOUT_SECONDS = 30.0
+# Size of the Pinecone REST client's connection pool
+PINECONE_POOL_THREADS = 30
+
+# Tuning options have defaults, so they are read at import; credentials are validated on first use (get_settings)
+# Embedding backend shared by ingest_cloud.py and the retrieval tool: "openai" (default) or "gguf"
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai").lower()
+# Local GGUF embedding model, used when EMBED_BACKEND is "gguf"
+GGUF_MODEL_PATH = os.getenv("GGUF_MODEL_PATH", "bge-large-en-v1.5-q8_0.gguf")
+TOP_K = int(os.getenv("TOP_K", "3")) # Number of chunks retrieved per query
+# Character budget for the context returned to the LLM, shared by the retrieved sections
+MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "4000"))
+RAG_DEBUG = os.getenv("RAG_DEBUG", "").lower() in ("1", "true", "yes") # Print retrieval progress messages
+
+@dataclass(frozen=True)
+class Settings:
+    """Credentials and Pinecone index settings shared by ingest_cloud.py and the retrieval tool."""
+    openai_api_key: Optional[str] # Not needed when EMBED_BACKEND is "gguf"
+    pinecone_api_key: str
+    pinecone_environment: str # This is the project environment/region for Pinecone
+    pinecone_index_name: str
+    # Pinecone spec - this might need to be adjusted based on the user's Pinecone setup
+    # Common choices: 'aws', 'gcp', 'azure'. Region also needs to be valid for the cloud.
+    # For starter/free tiers, it's often a specific environment like "gcp-starter" or "us-west1-gcp"
+    # For serverless, it would be ServerlessSpec(cloud='aws', region='us-west-2') for example.
+    pinecone_cloud_provider: str
+    pinecone_region: str
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Loads the .env file and builds the settings once per process.
+    Raises ValueError listing every missing required environment variable; a failure is not cached,
+    so a fixed .env is picked up on the next call.
+    """
+    load_dotenv()
+
+    required_vars = ["PINECONE_API_KEY", "PINECONE_ENVIRONMENT", "PINECONE_INDEX_NAME"]
+    if EMBED_BACKEND != "gguf":
+        required_vars.insert(0, "OPENAI_API_KEY")
+    missing_vars = [name for name in required_vars if not os.getenv(name)]
+    if missing_vars:
+        raise ValueError(
+            f"Missing required environment variables: {', '.join(missing_vars)}. "
+            "Set them in your .env file (see .env.example)."
+        )
+
+    return Settings(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        pinecone_api_key=os.getenv("PINECONE_API_KEY"),
+        pinecone_environment=os.getenv("PINECONE_ENVIRONMENT"),
+        pinecone_index_name=os.getenv("PINECONE_INDEX_NAME"),
+        pinecone_cloud_provider=os.getenv("PINECONE_CLOUD_PROVIDER", "aws"), # Default to aws
+        pinecone_region=os.getenv("PINECONE_REGION", "us-east-1"), # Default to us-east-1
+    )
+
+# One pooled HTTP/2 client shared by every OpenAI embeddings call in the process,
+# so connections (and their TLS handshakes) are reused instead of opened per client
+HTTP_CLIENT = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+    ),
+    timeout=HTTP_TIMEOUT_SECONDS
+)
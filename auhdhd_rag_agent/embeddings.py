@@ -0,0 +1,63 @@
+import threading
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from .config import EMBED_BACKEND, GGUF_MODEL_PATH, HTTP_CLIENT
+
+# Define constants
+# EMBED_BACKEND is shared by ingest_cloud.py and the retrieval tool; both must use the same one.
+# "openai" (default): text-embedding-ada-002 over the network
+# "gguf": local Q8_0 GGUF BGE-large model via llama-cpp-python, no network round trip
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+# OpenAI's text-embedding-ada-002 model dimension
+OPENAI_EMBEDDING_DIMENSION = 1536
+GGUF_EMBEDDING_DIMENSION = 1024
+GGUF_CONTEXT_SIZE = 512
+BGE_QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+# Switching backends changes the vector size, so the Pinecone index must be re-created and re-populated
+EMBEDDING_DIMENSION = GGUF_EMBEDDING_DIMENSION if EMBED_BACKEND == "gguf" else OPENAI_EMBEDDING_DIMENSION
+
+class GGUFEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by a GGUF-quantized model loaded with llama-cpp-python.
+    GGML kernels run directly on the quantized weights, so embedding is local and fast on CPU.
+    """
+
+    def __init__(self, model_path: str = GGUF_MODEL_PATH, n_ctx: int = GGUF_CONTEXT_SIZE):
+        # Imported here so the default OpenAI backend does not require llama-cpp-python
+        from llama_cpp import Llama
+
+        self.model = Llama(model_path=model_path, embedding=True, n_ctx=n_ctx, verbose=False)
+        # A llama.cpp context is not safe to use from several threads at once
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        with self._lock:
+            response = self.model.create_embedding(list(texts))
+        return [item["embedding"] for item in response["data"]]
+
+    def embed_query(self, text):
+        with self._lock:
+            response = self.model.create_embedding(BGE_QUERY_INSTRUCTION + text)
+        return response["data"][0]["embedding"]
+
+    def embed_queries(self, texts):
+        """Embeds several queries in one call, with the same retrieval instruction as embed_query."""
+        return self.embed_documents([BGE_QUERY_INSTRUCTION + text for text in texts])
+
+class BatchedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings with a batched embed_queries; ada-002 embeds queries and passages the same way."""
+
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+def build_embeddings(openai_api_key: str = None) -> Embeddings:
+    """Returns the embeddings model selected by EMBED_BACKEND."""
+    if EMBED_BACKEND == "gguf":
+        return GGUFEmbeddings()
+    return BatchedOpenAIEmbeddings(
+        openai_api_key=openai_api_key,
+        model=OPENAI_EMBEDDING_MODEL,
+        http_client=HTTP_CLIENT
+    )
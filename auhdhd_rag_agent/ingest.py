@@ -1,20 +1,185 @@
+import json
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
+import pickle
+import faiss
+import numpy as np
+from langchain_community.embeddings import QuantizedBgeEmbeddings
+from langchain_core.embeddings import Embeddings
+from .chunking import TokenAwareTextSplitter, iter_paragraph_blocks
 
 # Define constants
-KNOWLEDGE_FILE = "knowledge.txt"
-FAISS_INDEX_FILE = "faiss_index"
-EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
+# Paths are resolved next to this file so the script works from any working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWLEDGE_FILE = os.path.join(BASE_DIR, "knowledge.txt")
+FAISS_INDEX_FILE = os.path.join(BASE_DIR, "faiss_index")
+FAISS_INDEX_PATH = os.path.join(FAISS_INDEX_FILE, "index.faiss")
+# Maps FAISS row ids back to chunk text, plus the index type needed to read the index back
+DOCSTORE_PATH = os.path.join(FAISS_INDEX_FILE, "docstore.pkl")
+# Small-corpus layout (no FAISS index): one contiguous (N, d) float32 matrix plus a parallel list of texts
+VECTORS_PATH = os.path.join(FAISS_INDEX_FILE, "vecs.npy")
+TEXTS_PATH = os.path.join(FAISS_INDEX_FILE, "texts.json")
+# Raw float32 vectors are spilled here batch by batch during ingestion, then memory-mapped
+VECTORS_SPILL_PATH = os.path.join(FAISS_INDEX_FILE, "vecs.f32.tmp")
+# Records which embedding model built vecs.npy, so retrieval can refuse to query it with another one
+VECTORS_META_PATH = os.path.join(FAISS_INDEX_FILE, "vecs_meta.json")
+# Up to this many chunks, a brute-force matrix product beats any FAISS index, so none is built
+SMALL_CORPUS_MAX_VECTORS = 10_000
+EMBED_BATCH_SIZE = 512 # Chunks embedded per call while streaming the knowledge file
+# "binary": 1 bit per dimension, Hamming search (32x smaller than FP32)
+# "pq": product quantization, 64 bytes per vector with higher quality than binary
+# "hnsw": FP32 HNSW graph, sub-linear search time for large corpora
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "binary").lower()
+PQ_SUBQUANTIZERS = 64
+PQ_NBITS = 8
+HNSW_M = 32 # Graph neighbors per node
+HNSW_EF_CONSTRUCTION = 200 # Build-time search depth; higher gives a better graph and slower ingestion
+# INT8 statically quantized BGE model, run by the Intel Extension for Transformers (ITREX) backend
+EMBEDDING_MODEL = "Intel/bge-small-en-v1.5-sts-int8-static-inc"
+EMBEDDING_QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+# Optional CTranslate2 backend, enabled with INGEST_BACKEND=ct2
+INGEST_BACKEND = os.getenv("INGEST_BACKEND", "itrex").lower()
+CT2_EMBEDDING_MODEL = "michaelfeil/ct2fast-e5-small-v2"
+CT2_BATCH_SIZE = 64
+# Both backends produce 384-dim vectors, so the model name (not the dimension) identifies a store
+INGEST_EMBEDDING_MODEL = CT2_EMBEDDING_MODEL if INGEST_BACKEND == "ct2" else EMBEDDING_MODEL
+
+class CT2Embeddings(Embeddings):
+    """
+    Drop-in replacement for HuggingFaceEmbeddings backed by a CTranslate2 INT8 encoder.
+    Runs int8_float16 on CUDA and int8 on CPU.
+    """
+
+    def __init__(self, model_name: str = CT2_EMBEDDING_MODEL, batch_size: int = CT2_BATCH_SIZE):
+        # Imported here so the default backend does not require CTranslate2
+        import ctranslate2
+        from hf_hub_ctranslate2 import CT2SentenceTransformer
+
+        cuda_available = ctranslate2.get_cuda_device_count() > 0
+        self.batch_size = batch_size
+        self.model = CT2SentenceTransformer(
+            model_name_or_path=model_name,
+            device="cuda" if cuda_available else "cpu",
+            compute_type="int8_float16" if cuda_available else "int8"
+        )
+
+    def _encode(self, texts):
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        return vectors.tolist()
+
+    def embed_documents(self, texts):
+        # E5 models expect "passage: " / "query: " prefixes
+        return self._encode([f"passage: {text}" for text in texts])
+
+    def embed_query(self, text):
+        return self._encode([f"query: {text}"])[0]
+
+def get_embeddings() -> Embeddings:
+    """Returns the embeddings model selected by INGEST_BACKEND."""
+    if INGEST_BACKEND == "ct2":
+        print(f"Generating embeddings using CTranslate2 model '{INGEST_EMBEDDING_MODEL}'...")
+        return CT2Embeddings()
+
+    print(f"Generating embeddings using '{INGEST_EMBEDDING_MODEL}'...")
+    return QuantizedBgeEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        encode_kwargs={"normalize_embeddings": True},
+        query_instruction=EMBEDDING_QUERY_INSTRUCTION
+    )
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Quantizes float vectors to sign bits (1 where a component is > 0), packed 8 dimensions per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+def build_index(vectors: np.ndarray):
+    """
+    Builds the FAISS index selected by LOCAL_INDEX_TYPE from an (N, d) float32 matrix.
+    Returns the index and its type ("binary", "pq", "hnsw", or "flat" when PQ cannot be trained).
+    """
+    dim = vectors.shape[1]
+    if LOCAL_INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.add(vectors)
+        return index, "hnsw"
+
+    if LOCAL_INDEX_TYPE == "pq":
+        # Training needs at least 2**nbits vectors per sub-quantizer codebook
+        if len(vectors) >= 2 ** PQ_NBITS and dim % PQ_SUBQUANTIZERS == 0:
+            index = faiss.IndexPQ(dim, PQ_SUBQUANTIZERS, PQ_NBITS)
+            index.train(vectors)
+            index.add(vectors)
+            return index, "pq"
+        print(f"Not enough vectors to train a PQ index ({len(vectors)}), using a flat index instead.")
+        index = faiss.IndexFlatL2(dim)
+        index.add(vectors)
+        return index, "flat"
+
+    index = faiss.IndexBinaryFlat(dim)
+    index.add(binarize(vectors))
+    return index, "binary"
+
+def save_index(index, index_type: str, texts: list) -> None:
+    """Writes the FAISS index and the row id -> text docstore to FAISS_INDEX_FILE."""
+    os.makedirs(FAISS_INDEX_FILE, exist_ok=True)
+    if index_type == "binary":
+        faiss.write_index_binary(index, FAISS_INDEX_PATH)
+    else:
+        faiss.write_index(index, FAISS_INDEX_PATH)
+    with open(DOCSTORE_PATH, "wb") as f:
+        pickle.dump({
+            "index_type": index_type,
+            "embedding_model": INGEST_EMBEDDING_MODEL,
+            "docstore": dict(enumerate(texts))
+        }, f)
+
+def save_vectors(vectors: np.ndarray, texts: list) -> None:
+    """Writes the contiguous float32 vector matrix and the parallel list of chunk texts."""
+    os.makedirs(FAISS_INDEX_FILE, exist_ok=True)
+    np.save(VECTORS_PATH, np.ascontiguousarray(vectors, dtype=np.float32))
+    with open(TEXTS_PATH, "w", encoding="utf-8") as f:
+        json.dump(texts, f)
+    with open(VECTORS_META_PATH, "w", encoding="utf-8") as f:
+        json.dump({"embedding_model": INGEST_EMBEDDING_MODEL}, f)
+
+def check_embedding_model(stored_model: str, path: str) -> None:
+    """
+    Raises ValueError when the store at `path` was built with a different embedding model
+    than INGEST_BACKEND selects now; stores written before the model was recorded are not checked.
+    """
+    if stored_model is not None and stored_model != INGEST_EMBEDDING_MODEL:
+        raise ValueError(
+            f"'{path}' was built with embedding model '{stored_model}', but INGEST_BACKEND='{INGEST_BACKEND}' "
+            f"embeds queries with '{INGEST_EMBEDDING_MODEL}'. Set the same INGEST_BACKEND or re-run ingestion."
+        )
+
+def remove_index() -> None:
+    """Deletes a previously saved FAISS index so retrieval does not use stale data."""
+    for path in (FAISS_INDEX_PATH, DOCSTORE_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+def remove_vectors() -> None:
+    """Deletes a previously saved small-corpus vector matrix, which the FAISS index replaces."""
+    for path in (VECTORS_PATH, TEXTS_PATH, VECTORS_META_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _embed_batch(embeddings, batch: list, spill) -> int:
+    """Embeds `batch` and appends the float32 vectors to the open spill file. Returns the vector dimension."""
+    vectors = np.asarray(embeddings.embed_documents(batch), dtype=np.float32)
+    spill.write(vectors.tobytes())
+    return vectors.shape[1]
 
 def ingest_documents():
     """
-    Loads documents from the knowledge file, splits them into chunks,
-    generates embeddings, and saves them to a FAISS vector store.
+    Streams the knowledge file, splits it into chunks, generates embeddings batch by batch,
+    and saves them as a contiguous vector matrix, or as a quantized FAISS index
+    for corpora too large for brute-force search.
     """
     print("Starting document ingestion process...")
 
@@ -23,41 +188,74 @@ def ingest_documents():
         print(f"Error: Knowledge file '{KNOWLEDGE_FILE}' not found.")
         return
 
-    print("Loading documents...")
-    loader = TextLoader(KNOWLEDGE_FILE)
-    documents = loader.load()
+    embeddings = get_embeddings()
+    text_splitter = TokenAwareTextSplitter()
 
-    if not documents:
-        print("No documents found in the knowledge file.")
+    # Stream the file block by block and embed the chunks in batches. Vectors are spilled to disk
+    # as they are produced, so only one block of text and one batch of vectors are held in memory
+    # besides the chunk texts, which the saved store keeps in full anyway.
+    print(f"Streaming '{KNOWLEDGE_FILE}' into token-aware chunks (embedding batches of {EMBED_BATCH_SIZE})...")
+    os.makedirs(FAISS_INDEX_FILE, exist_ok=True)
+    chunk_texts = []
+    batch = []
+    dim = None
+    try:
+        with open(VECTORS_SPILL_PATH, "wb") as spill:
+            for block in iter_paragraph_blocks(KNOWLEDGE_FILE):
+                for chunk in text_splitter.split_text(block):
+                    chunk_texts.append(chunk)
+                    batch.append(chunk)
+                    if len(batch) == EMBED_BATCH_SIZE:
+                        dim = _embed_batch(embeddings, batch, spill)
+                        batch = []
+                        print(f"Embedded {len(chunk_texts)} chunks so far...")
+            if batch:
+                dim = _embed_batch(embeddings, batch, spill)
+    except Exception as e:
+        print(f"Error generating embeddings: {e}")
+        os.remove(VECTORS_SPILL_PATH)
         return
 
-    print("Splitting text into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
-    )
-    texts = text_splitter.split_documents(documents)
-
-    if not texts:
+    if not chunk_texts:
         print("Text splitting resulted in no chunks.")
+        os.remove(VECTORS_SPILL_PATH)
         return
 
-    print(f"Generating embeddings using '{EMBEDDING_MODEL}'...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-
-    print("Creating FAISS vector store...")
+    vectors = np.memmap(VECTORS_SPILL_PATH, dtype=np.float32, mode="r", shape=(len(chunk_texts), dim))
     try:
-        vector_store = FAISS.from_documents(texts, embeddings)
-    except Exception as e:
-        print(f"Error creating FAISS vector store: {e}")
-        return
+        # Only one layout is kept: the full FP32 matrix for brute-force search, or the (quantized) index
+        if len(vectors) <= SMALL_CORPUS_MAX_VECTORS:
+            print(f"Saving {len(chunk_texts)} vectors to '{FAISS_INDEX_FILE}'...")
+            try:
+                save_vectors(vectors, chunk_texts)
+            except Exception as e:
+                print(f"Error saving vectors: {e}")
+                return
+            remove_index()
+            print("Small corpus: skipping the FAISS index, retrieval will use brute-force search.")
+            print("Vector store created and saved successfully.")
+            return
 
-    print(f"Saving FAISS index to '{FAISS_INDEX_FILE}'...")
-    try:
-        vector_store.save_local(FAISS_INDEX_FILE)
+        print(f"Creating {LOCAL_INDEX_TYPE} FAISS index from {len(chunk_texts)} vectors...")
+        try:
+            index, index_type = build_index(vectors)
+        except Exception as e:
+            print(f"Error creating FAISS index: {e}")
+            return
+
+        print(f"Saving FAISS index to '{FAISS_INDEX_FILE}'...")
+        try:
+            save_index(index, index_type, chunk_texts)
+        except Exception as e:
+            print(f"Error saving FAISS index: {e}")
+            return
+        remove_vectors()
         print("Vector store created and saved successfully.")
-    except Exception as e:
-        print(f"Error saving FAISS index: {e}")
+    finally:
+        # Release the mapping before deleting the spill file
+        del vectors
+        os.remove(VECTORS_SPILL_PATH)
 
 if __name__ == "__main__":
+    # Run as a module from the repository root: python -m auhdhd_rag_agent.ingest
     ingest_documents()
@@ -1,49 +1,69 @@
 import os
-from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
 from pinecone import Pinecone as PineconeClient, ServerRelativeSpec # For index management
+from .chunking import (
+    PARENT_CHUNK_MAX_TOKENS,
+    PARENT_CHUNK_OVERLAP_TOKENS,
+    TokenAwareTextSplitter,
+    iter_paragraph_blocks,
+    split_parent_child,
+)
+from .config import PINECONE_POOL_THREADS, get_settings
+from .embeddings import EMBED_BACKEND, EMBEDDING_DIMENSION, build_embeddings
 
 # Define constants
 KNOWLEDGE_FILE_PATH = "auhdhd_rag_agent/knowledge.txt"
-# OpenAI's text-embedding-ada-002 model dimension
-OPENAI_EMBEDDING_DIMENSION = 1536
-# Pinecone spec - this might need to be adjusted based on the user's Pinecone setup
-# Common choices: 'aws', 'gcp', 'azure'. Region also needs to be valid for the cloud.
-# For starter/free tiers, it's often a specific environment like "gcp-starter" or "us-west1-gcp"
-# For serverless, it would be ServerlessSpec(cloud='aws', region='us-west-2') for example.
-# Using a common default, but user might need to change this.
-PINECONE_CLOUD_PROVIDER = os.getenv("PINECONE_CLOUD_PROVIDER", "aws") # Default to aws
-PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1") # Default to us-east-1
+# Batching: one OpenAI request embeds many chunks, and upserts are sent to Pinecone concurrently.
+EMBED_BATCH_SIZE = 512 # Texts per OpenAI embeddings request
+UPSERT_BATCH_SIZE = 100 # Vectors per Pinecone upsert request
+UPSERT_MAX_WORKERS = 8 # Concurrent Pinecone upsert requests
+
+def _batched(items, batch_size):
+    """Yields consecutive slices of `items` holding at most `batch_size` elements."""
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def _embed_and_upsert(chunks: list, embeddings, index, executor) -> int:
+    """
+    Embeds `chunks` in one request and upserts them to Pinecone in concurrent batches.
+    Waits for the upserts so the vectors can be released before the next batch. Returns the number upserted.
+    """
+    batch_vectors = embeddings.embed_documents([doc.page_content for doc in chunks])
+    vectors = [
+        # PineconeVectorStore reads the chunk text back from the "text" metadata key
+        (str(uuid.uuid4()), values, {**doc.metadata, "text": doc.page_content})
+        for doc, values in zip(chunks, batch_vectors)
+    ]
+    futures = [
+        executor.submit(index.upsert, vectors=batch)
+        for batch in _batched(vectors, UPSERT_BATCH_SIZE)
+    ]
+    for future in futures:
+        future.result()
+    return len(vectors)
 
 def ingest_documents_to_pinecone():
     """
-    Loads documents, splits them, generates embeddings using OpenAI,
-    and upserts them to a Pinecone vector store.
+    Loads documents, splits them, generates embeddings with the configured backend
+    (OpenAI by default, or a local GGUF model), and upserts them to a Pinecone vector store.
     """
     print("Starting document ingestion process for Pinecone...")
 
-    # Load environment variables
-    load_dotenv()
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    pinecone_api_key = os.getenv("PINECONE_API_KEY")
-    pinecone_environment = os.getenv("PINECONE_ENVIRONMENT") # This is the project environment/region for Pinecone
-    pinecone_index_name = os.getenv("PINECONE_INDEX_NAME")
-
-    # Validate environment variables
-    if not all([openai_api_key, pinecone_api_key, pinecone_environment, pinecone_index_name]):
-        print("Error: Missing one or more required environment variables:")
-        if not openai_api_key: print("- OPENAI_API_KEY")
-        if not pinecone_api_key: print("- PINECONE_API_KEY")
-        if not pinecone_environment: print("- PINECONE_ENVIRONMENT (e.g., 'gcp-starter', 'us-east-1')")
-        if not pinecone_index_name: print("- PINECONE_INDEX_NAME")
+    # Environment variables are loaded and validated in config.py
+    try:
+        settings = get_settings()
+    except ValueError as e:
+        print(f"Error: {e}")
         return
+    pinecone_index_name = settings.pinecone_index_name
 
     print("Initializing Pinecone client...")
     try:
-        pc = PineconeClient(api_key=pinecone_api_key) # environment is not passed here for v3.x client
+        # environment is not passed here for v3.x client; one client and connection pool serve all upserts
+        pc = PineconeClient(api_key=settings.pinecone_api_key, pool_threads=PINECONE_POOL_THREADS)
     except Exception as e:
         print(f"Error initializing Pinecone client: {e}")
         return
@@ -58,13 +78,13 @@ def ingest_documents_to_pinecone():
             # The spec parameter is crucial and depends on the type of Pinecone index (serverless vs. pod-based).
             # ServerRelativeSpec is for pod-based indexes.
             # For serverless, it would be: from pinecone import ServerlessSpec
-            # spec = ServerlessSpec(cloud=PINECONE_CLOUD_PROVIDER, region=PINECONE_REGION)
+            # spec = ServerlessSpec(cloud=settings.pinecone_cloud_provider, region=settings.pinecone_region)
             # For this example, assuming a pod-based index for now.
             pc.create_index(
                 name=pinecone_index_name,
-                dimension=OPENAI_EMBEDDING_DIMENSION,
+                dimension=EMBEDDING_DIMENSION,
                 metric='cosine',
-                spec=ServerRelativeSpec(cloud=PINECONE_CLOUD_PROVIDER, region=PINECONE_REGION)
+                spec=ServerRelativeSpec(cloud=settings.pinecone_cloud_provider, region=settings.pinecone_region)
             )
             print(f"Pinecone index '{pinecone_index_name}' created successfully.")
         except Exception as e:
@@ -75,56 +95,63 @@ def ingest_documents_to_pinecone():
             return
     else:
         print(f"Pinecone index '{pinecone_index_name}' already exists.")
+        index_dimension = pc.describe_index(pinecone_index_name).dimension
+        if index_dimension != EMBEDDING_DIMENSION:
+            print(f"Error: Index '{pinecone_index_name}' has dimension {index_dimension}, but the '{EMBED_BACKEND}' "
+                  f"embedding backend produces {EMBEDDING_DIMENSION}-dimensional vectors.")
+            print("Delete the index (or use a new PINECONE_INDEX_NAME) and re-run ingestion to re-index.")
+            return
 
-    # Initialize OpenAI Embeddings
-    print("Initializing OpenAI embeddings model...")
+    # Initialize the embeddings model
+    print(f"Initializing '{EMBED_BACKEND}' embeddings model...")
     try:
-        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key, model="text-embedding-ada-002")
+        embeddings = build_embeddings(settings.openai_api_key)
     except Exception as e:
-        print(f"Error initializing OpenAIEmbeddings: {e}")
+        print(f"Error initializing embeddings: {e}")
         return
 
-    # Load and split documents
-    print(f"Loading documents from '{KNOWLEDGE_FILE_PATH}'...")
     if not os.path.exists(KNOWLEDGE_FILE_PATH):
         print(f"Error: Knowledge file '{KNOWLEDGE_FILE_PATH}' not found.")
         return
-    try:
-        loader = TextLoader(file_path=KNOWLEDGE_FILE_PATH, encoding="utf-8")
-        documents = loader.load()
-    except Exception as e:
-        print(f"Error loading documents: {e}")
-        return
-
-    if not documents:
-        print("No documents found in the knowledge file.")
-        return
 
-    print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_documents(documents)
-
-    if not texts:
-        print("Text splitting resulted in no chunks.")
-        return
-    
-    print(f"Found {len(texts)} text chunks to embed and upsert.")
-
-    # Generate embeddings and upsert to Pinecone
-    print(f"Generating embeddings and upserting to Pinecone index '{pinecone_index_name}'...")
+    # Stream the file: each block is split lazily, and child chunks flow through a bounded buffer
+    # into the embed+upsert stage, so memory is bounded by one block plus one batch of vectors.
+    # Only the small child chunks are embedded; each keeps its parent chunk's text in metadata.
+    print(f"Streaming documents from '{KNOWLEDGE_FILE_PATH}' into Pinecone index '{pinecone_index_name}' "
+          f"(embedding batches of {EMBED_BATCH_SIZE}, upsert batches of {UPSERT_BATCH_SIZE}, {UPSERT_MAX_WORKERS} workers)...")
+    parent_splitter = TokenAwareTextSplitter(
+        max_tokens=PARENT_CHUNK_MAX_TOKENS,
+        overlap_tokens=PARENT_CHUNK_OVERLAP_TOKENS
+    )
+    child_splitter = TokenAwareTextSplitter()
+    pending = deque(maxlen=EMBED_BATCH_SIZE)
+    total_upserted = 0
     try:
-        PineconeVectorStore.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            index_name=pinecone_index_name
-            # namespace can be added here if needed: namespace="your_namespace"
-        )
-        print("Documents successfully ingested into Pinecone.")
+        index = pc.Index(pinecone_index_name)
+        with ThreadPoolExecutor(max_workers=UPSERT_MAX_WORKERS) as executor:
+            for block in iter_paragraph_blocks(KNOWLEDGE_FILE_PATH):
+                document = Document(page_content=block, metadata={"source": KNOWLEDGE_FILE_PATH})
+                for chunk in split_parent_child([document], parent_splitter, child_splitter):
+                    pending.append(chunk)
+                    if len(pending) == pending.maxlen:
+                        total_upserted += _embed_and_upsert(list(pending), embeddings, index, executor)
+                        pending.clear()
+                        print(f"Upserted {total_upserted} child chunks so far...")
+            if pending:
+                total_upserted += _embed_and_upsert(list(pending), embeddings, index, executor)
+                pending.clear()
     except Exception as e:
         print(f"Error during embedding generation or upserting to Pinecone: {e}")
         print("Ensure your OpenAI API key has embedding permissions and your Pinecone index is configured correctly.")
+        return
+
+    if not total_upserted:
+        print("No text chunks found in the knowledge file.")
+        return
+    print(f"Documents successfully ingested into Pinecone ({total_upserted} child chunks).")
 
 if __name__ == "__main__":
+    # Run as a module from the repository root: python -m auhdhd_rag_agent.ingest_cloud
     ingest_documents_to_pinecone()
     print("\n--- Ingestion Script Finished ---")
     print("Important Reminders:")
@@ -0,0 +1,185 @@
+import json
+import os
+import pickle
+from functools import lru_cache
+import faiss
+import numpy as np
+from .ingest import (
+    DOCSTORE_PATH,
+    FAISS_INDEX_FILE,
+    FAISS_INDEX_PATH,
+    TEXTS_PATH,
+    VECTORS_META_PATH,
+    VECTORS_PATH,
+    binarize,
+    check_embedding_model,
+    get_embeddings,
+)
+
+# Define constants
+TOP_K_RESULTS = 3
+# Below this batch size the host<->GPU transfer costs more than the search, so the CPU index is used
+GPU_MIN_BATCH_SIZE = 32
+# HNSW query-time search depth: higher improves recall at the cost of latency
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+# Memory-map the index read-only instead of copying it into RAM: startup no longer deserializes
+# the whole index, and worker processes share the same page-cache pages.
+# IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC maps the code and HNSW graph arrays
+# of the flat, PQ, HNSW and binary indexes. FAISS builds without it fall back to IO_FLAG_MMAP.
+FAISS_IO_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+@lru_cache(maxsize=1)
+def _load_vectors():
+    """
+    Loads the (N, d) float32 vector matrix (memory-mapped) and the parallel list of texts once per process.
+    Raises ValueError when the vectors were built with a different embedding model.
+    """
+    if os.path.exists(VECTORS_META_PATH):
+        with open(VECTORS_META_PATH, encoding="utf-8") as f:
+            check_embedding_model(json.load(f).get("embedding_model"), VECTORS_PATH)
+    vectors = np.load(VECTORS_PATH, mmap_mode="r")
+    with open(TEXTS_PATH, encoding="utf-8") as f:
+        texts = json.load(f)
+    return vectors, texts
+
+@lru_cache(maxsize=1)
+def _load_index():
+    """
+    Memory-maps the FAISS index written by ingest.py once per process.
+    Returns (index, index_type, docstore) where docstore maps row ids to chunk text,
+    or None when ingestion skipped the index because the corpus is small.
+    Raises ValueError when the index was built with a different embedding model.
+    """
+    if not os.path.exists(FAISS_INDEX_PATH):
+        return None
+    with open(DOCSTORE_PATH, "rb") as f:
+        store = pickle.load(f)
+    check_embedding_model(store.get("embedding_model"), FAISS_INDEX_PATH)
+    index_type = store["index_type"]
+    if index_type == "binary":
+        index = faiss.read_index_binary(FAISS_INDEX_PATH, FAISS_IO_FLAGS)
+    else:
+        index = faiss.read_index(FAISS_INDEX_PATH, FAISS_IO_FLAGS)
+    if index_type == "hnsw":
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index, index_type, store["docstore"]
+
+@lru_cache(maxsize=1)
+def _get_gpu_index():
+    """
+    Copies the index to all visible GPUs once per process.
+    Returns None when FAISS has no GPU support, no GPU is present, or the index type cannot run on GPU.
+    """
+    if not hasattr(faiss, "get_num_gpus") or faiss.get_num_gpus() == 0:
+        return None
+
+    loaded = _load_index()
+    if loaded is None:
+        return None
+    index, index_type, _ = loaded
+    try:
+        if index_type == "binary":
+            resources = faiss.StandardGpuResources()
+            gpu_index = faiss.GpuIndexBinaryFlat(resources, index)
+            # Keep the GPU resources alive for as long as the index
+            gpu_index.referenced_objects = [resources]
+        else:
+            gpu_index = faiss.index_cpu_to_all_gpus(index)
+    except Exception as e:
+        print(f"Could not move FAISS index to GPU, searching on CPU: {e}")
+        return None
+    print(f"FAISS index copied to {faiss.get_num_gpus()} GPU(s).")
+    return gpu_index
+
+@lru_cache(maxsize=1)
+def _get_embeddings():
+    """Builds the same embeddings model used at ingestion once per process."""
+    return get_embeddings()
+
+def _encode_queries(query_vectors: np.ndarray, index_type: str) -> np.ndarray:
+    """Converts float query vectors to the representation the index searches (packed bits for binary)."""
+    if index_type == "binary":
+        return binarize(query_vectors)
+    return np.ascontiguousarray(query_vectors, dtype=np.float32)
+
+def _search_vectors(queries: np.ndarray, k: int):
+    """
+    Brute-force inner-product search over the contiguous vector matrix.
+    Returns (scores, ids) of shape (n, k), best match first; higher scores are better.
+    """
+    vectors, _ = _load_vectors()
+    k = min(k, len(vectors))
+    if k == 0:
+        empty = np.empty((len(queries), 0))
+        return empty, empty.astype(np.int64)
+    scores = np.ascontiguousarray(queries, dtype=np.float32) @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+def search_batch(queries: np.ndarray, k: int = TOP_K_RESULTS):
+    """
+    Searches the local corpus for a batch of (n, d) float32 query vectors.
+    Small corpora (no FAISS index) are scored with one matrix product over the vector matrix.
+    Otherwise, batches of at least GPU_MIN_BATCH_SIZE run on GPU when one is available; smaller ones stay on CPU.
+    Returns (scores or distances, ids) arrays of shape (n, k); ids are -1 where fewer than k results exist.
+    """
+    loaded = _load_index()
+    if loaded is None:
+        return _search_vectors(queries, k)
+    index, index_type, _ = loaded
+    encoded = _encode_queries(queries, index_type)
+    if len(encoded) >= GPU_MIN_BATCH_SIZE:
+        gpu_index = _get_gpu_index()
+        if gpu_index is not None:
+            return gpu_index.search(encoded, k)
+    return index.search(encoded, k)
+
+def _get_texts():
+    """Returns the row id -> chunk text mapping for whichever search path is in use."""
+    loaded = _load_index()
+    if loaded is None:
+        return _load_vectors()[1]
+    return loaded[2]
+
+def query_local_knowledge_base(user_query: str) -> dict:
+    """
+    Retrieves relevant information from the local knowledge base built by ingest.py.
+    Args:
+        user_query (str): The user's query or question to search for in the knowledge base.
+    Returns:
+        dict: Same format as retrieve_knowledge_tool.query_knowledge_base.
+    """
+    try:
+        texts = _get_texts()
+    except Exception as e:
+        error_message = f"Error loading local knowledge base from '{FAISS_INDEX_FILE}': {e}"
+        print(error_message)
+        print("Run 'python -m auhdhd_rag_agent.ingest' to build the local index.")
+        return {"status": "error", "message": error_message, "retrieved_context": ""}
+
+    try:
+        query_vector = np.asarray([_get_embeddings().embed_query(user_query)], dtype=np.float32)
+        _, ids = search_batch(query_vector, TOP_K_RESULTS)
+    except Exception as e:
+        error_message = f"Error during similarity search: {e}"
+        print(error_message)
+        return {"status": "error", "message": error_message, "retrieved_context": ""}
+
+    # FAISS pads with -1 when the index holds fewer than k vectors
+    retrieved_texts = [texts[int(i)] for i in ids[0] if i != -1]
+    if not retrieved_texts:
+        return {"status": "success", "message": "No relevant information found in the knowledge base.", "retrieved_context": ""}
+    return {"status": "success", "retrieved_context": "\n\n---\n\n".join(retrieved_texts)}
+
+if __name__ == '__main__':
+    # Requires an index built by: python -m auhdhd_rag_agent.ingest
+    test_query = "What is a RAG model?"
+    result = query_local_knowledge_base(test_query)
+    print(f"Query: {test_query}")
+    print(f"Status: {result.get('status')}")
+    if result.get('message'):
+        print(f"Message: {result.get('message')}")
+    if result.get('retrieved_context'):
+        print(f"Retrieved Context:\n{result['retrieved_context']}")
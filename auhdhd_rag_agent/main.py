@@ -1,7 +1,24 @@
 import os
+import threading
 from dotenv import load_dotenv
 from google.adk.runtime import Runner
-from .agent import rag_agent # Assuming rag_agent is an instance of Agent
+from .agent import WARMUP_QUERIES, rag_agent # Assuming rag_agent is an instance of Agent
+from .retrieve_knowledge_tool import get_cached_embedder, query_knowledge_base_batch
+
+def warm_up_caches():
+    """
+    Embeds the warmup queries in one batch and pins them in the embedding cache,
+    then fills the context cache for them in a background thread.
+    """
+    if not WARMUP_QUERIES:
+        return
+    try:
+        get_cached_embedder().warmup(WARMUP_QUERIES)
+    except Exception as e:
+        print(f"Warning: could not pre-compute warmup query embeddings: {e}")
+        return
+    threading.Thread(target=query_knowledge_base_batch, args=(WARMUP_QUERIES,), daemon=True).start()
+    print(f"Pre-computed embeddings for {len(WARMUP_QUERIES)} warmup queries.")
 
 def run_cli():
     """Runs the Command Line Interface for the AuDHD RAG Agent."""
@@ -25,9 +42,12 @@ def run_cli():
         print("Please ensure your agent.py is correctly defined and OPENROUTER_API_KEY is set.")
         return
 
+    # Avoid the cold-start embedding and Pinecone round trips for common first questions
+    warm_up_caches()
+
     # CLI Interaction Loop
     print("\nAuDHD RAG Agent CLI. Type 'exit' to quit.")
-    print("Note: Ensure you have run 'python auhdhd_rag_agent/ingest.py' to build the knowledge base.")
+    print("Note: Ensure you have run 'python -m auhdhd_rag_agent.ingest' to build the knowledge base.")
     print("      And that your OPENROUTER_API_KEY is correctly set in .env")
 
 
@@ -1,20 +1,171 @@
-import os
-from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from langchain_core.documents import Document
 from langchain_pinecone import PineconeVectorStore
-# from pinecone import Pinecone as PineconeClient # Not strictly needed if PineconeVectorStore handles client init
-
-# Load environment variables from .env file at module level
-load_dotenv()
+from pinecone.grpc import PineconeGRPC # gRPC client: HTTP/2 multiplexes concurrent queries on one connection
+from .cache import CachedEmbedder, LRUEmbeddingCache
+from .config import MAX_CONTEXT_CHARS, RAG_DEBUG, TOP_K, get_settings
+from .embeddings import EMBED_BACKEND, build_embeddings
 
 # Define constants (optional, but good practice)
-OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
-TOP_K_RESULTS = 3
+TOP_K_RESULTS = TOP_K
+# Retrieved chunks whose word-shingle Jaccard similarity with an already kept chunk reaches
+# this threshold are dropped as near-duplicates (e.g. overlapping neighbors)
+DEDUPE_JACCARD_THRESHOLD = 0.6
+SHINGLE_SIZE = 5
+CACHE_CAPACITY = 1000
+CACHE_TTL_SECONDS = 3600
+BATCH_MAX_WORKERS = 8 # Concurrent Pinecone queries in query_knowledge_base_batch
+# Progress messages are only printed (and formatted) when RAG_DEBUG is set; errors are always printed
+_DEBUG = RAG_DEBUG
+_NO_MATCH_MESSAGE = "No relevant information found in the knowledge base."
+_SECTION_SEPARATOR = "\n\n---\n\n"
+_join_sections = _SECTION_SEPARATOR.join
+
+# Maps a user query to its formatted retrieval result, so repeated queries skip both embedding and Pinecone.
+_context_cache = LRUEmbeddingCache(capacity=CACHE_CAPACITY, ttl=CACHE_TTL_SECONDS)
+_context_cache_get = _context_cache.get
+
+@lru_cache(maxsize=1)
+def _get_embeddings():
+    """
+    Builds the embeddings model selected by EMBED_BACKEND once per process and reuses it for every query.
+    Raises ValueError when required environment variables are missing.
+    """
+    settings = get_settings()
+    if _DEBUG:
+        print(f"Initializing '{EMBED_BACKEND}' embeddings model...")
+    return build_embeddings(settings.openai_api_key)
+
+@lru_cache(maxsize=1)
+def get_cached_embedder() -> CachedEmbedder:
+    """
+    Returns the process-wide embedder that caches query embeddings in front of the embeddings model.
+    """
+    return CachedEmbedder(
+        _get_embeddings(),
+        LRUEmbeddingCache(capacity=CACHE_CAPACITY, ttl=CACHE_TTL_SECONDS)
+    )
+
+@lru_cache(maxsize=1)
+def _get_pinecone_index():
+    """
+    Opens a gRPC connection to the existing Pinecone index once per process.
+    Raises ValueError when required environment variables are missing.
+    """
+    settings = get_settings()
+    if _DEBUG:
+        print(f"Connecting to Pinecone index '{settings.pinecone_index_name}' over gRPC...")
+    pc = PineconeGRPC(api_key=settings.pinecone_api_key)
+    index = pc.Index(settings.pinecone_index_name)
+    if _DEBUG:
+        print("Successfully connected to Pinecone index.")
+    return index
+
+@lru_cache(maxsize=1)
+def _get_vector_store() -> PineconeVectorStore:
+    """
+    Wraps the shared Pinecone index in a LangChain vector store once per process.
+    """
+    # The cached embedder is passed so any embedding done by the store itself also goes through the cache.
+    return PineconeVectorStore(
+        index=_get_pinecone_index(),
+        embedding=get_cached_embedder(),
+        text_key="text"
+    )
+
+def cache_stats() -> dict:
+    """Returns hit-rate counters for the context and embedding caches."""
+    stats = {"context_cache": _context_cache.stats()}
+    if get_cached_embedder.cache_info().currsize:
+        stats["embedding_cache"] = get_cached_embedder().stats()
+    return stats
+
+def _shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    """Returns the set of lowercase word k-shingles of `text` (a single shingle for texts under k words)."""
+    words = text.lower().split()
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def _section_budgets(lengths: list, budget: int) -> list:
+    """
+    Splits `budget` characters across sections of the given lengths: each gets an equal share,
+    and whatever a shorter section does not need goes to the longer ones.
+    """
+    shares = [0] * len(lengths)
+    remaining = budget
+    by_length = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for position, i in enumerate(by_length):
+        shares[i] = min(lengths[i], remaining // (len(lengths) - position))
+        remaining -= shares[i]
+    return shares
+
+def _fit_window(text: str, focus: str, width: int) -> str:
+    """
+    Returns `text` cut to `width` characters, keeping the window centred on `focus`
+    (the matched child chunk) so the excerpt contains the passage that was retrieved.
+    """
+    if len(text) <= width:
+        return text
+    position = text.find(focus)
+    if position < 0:
+        return text[:width].rstrip()
+    center = position + len(focus) // 2
+    start = min(max(center - width // 2, 0), len(text) - width)
+    return text[start:start + width].strip()
+
+def _format_context(retrieved_docs: list) -> str:
+    """
+    Joins retrieved chunks into one context string.
+    Child chunks are replaced by their parent chunk text, and each parent is included only once.
+    Near-duplicate sections are dropped, and the rest share MAX_CONTEXT_CHARS: a section over its
+    share is cut to a window around the child chunk that matched.
+    """
+    seen_parent_ids = set()
+    candidates = [] # (section text, matched chunk text)
+    for doc in retrieved_docs:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id is None:
+            # Chunk ingested without a parent (older index); use it as is
+            candidates.append((doc.page_content, doc.page_content))
+        elif parent_id not in seen_parent_ids:
+            seen_parent_ids.add(parent_id)
+            candidates.append((doc.metadata.get("parent_text", doc.page_content), doc.page_content))
+
+    kept_shingles = []
+    sections = []
+    for text, focus in candidates:
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, other) >= DEDUPE_JACCARD_THRESHOLD for other in kept_shingles):
+            continue
+        kept_shingles.append(shingles)
+        sections.append((text, focus))
+    if not sections:
+        return ""
+
+    budget = MAX_CONTEXT_CHARS - len(_SECTION_SEPARATOR) * (len(sections) - 1)
+    shares = _section_budgets([len(text) for text, _ in sections], budget)
+    return _join_sections([
+        _fit_window(text, focus, share)
+        for (text, focus), share in zip(sections, shares)
+        if share > 0
+    ])
+
+def _context_result(formatted_context: str) -> dict:
+    """Builds the tool's success response for a formatted context string (empty means no match)."""
+    if not formatted_context:
+        return {"status": "success", "message": _NO_MATCH_MESSAGE, "retrieved_context": ""}
+    return {"status": "success", "retrieved_context": formatted_context}
 
 def query_knowledge_base(user_query: str) -> dict:
     """
     Retrieves relevant information from the knowledge base hosted on Pinecone to answer the user's query.
-    Uses OpenAI to generate embeddings for the query before searching.
+    Embeds the query with the configured embedding model before searching.
     Use this tool when you need to find specific information or context to respond to the user.
     Args:
         user_query (str): The user's query or question to search for in the knowledge base.
@@ -23,78 +174,160 @@ def query_knowledge_base(user_query: str) -> dict:
               Example: {"status": "success", "retrieved_context": "Relevant text..."}
                        or {"status": "error", "message": "Error details..."}
     """
-    print(f"Received query for Pinecone: {user_query}")
-
-    # Retrieve API keys and Pinecone configuration from environment variables
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    pinecone_api_key = os.getenv("PINECONE_API_KEY")
-    # PINECONE_ENVIRONMENT is used by Pinecone client implicitly if set as an env var.
-    # Not directly passed to PineconeVectorStore.from_existing_index in latest versions.
-    pinecone_environment = os.getenv("PINECONE_ENVIRONMENT") 
-    pinecone_index_name = os.getenv("PINECONE_INDEX_NAME")
-
-    # Validate environment variables
-    if not all([openai_api_key, pinecone_api_key, pinecone_environment, pinecone_index_name]):
-        missing_vars = []
-        if not openai_api_key: missing_vars.append("OPENAI_API_KEY")
-        if not pinecone_api_key: missing_vars.append("PINECONE_API_KEY")
-        if not pinecone_environment: missing_vars.append("PINECONE_ENVIRONMENT")
-        if not pinecone_index_name: missing_vars.append("PINECONE_INDEX_NAME")
-        error_message = f"Error: Missing required environment variables: {', '.join(missing_vars)}"
+    if _DEBUG:
+        print(f"Received query for Pinecone: {user_query}")
+
+    cached_context = _context_cache_get(user_query)
+    if cached_context is not None:
+        if _DEBUG:
+            print("Returning cached context for query.")
+        return _context_result(cached_context)
+
+    try:
+        vector_store = _get_vector_store()
+        embedder = get_cached_embedder()
+    except Exception as e:
+        error_message = f"Error connecting to Pinecone index: {e}"
         print(error_message)
+        print("Ensure the index name matches an existing index in your Pinecone project.")
         return {"status": "error", "message": error_message, "retrieved_context": ""}
 
-    print("Initializing OpenAI embeddings model...")
+    if _DEBUG:
+        print(f"Performing similarity search in Pinecone for query: '{user_query}'")
     try:
-        embeddings = OpenAIEmbeddings(
-            openai_api_key=openai_api_key,
-            model=OPENAI_EMBEDDING_MODEL
+        # Embed once (or reuse the cached vector) and search by vector, so the store does not re-embed the query
+        query_vector = embedder.embed_query(user_query)
+        retrieved_docs = vector_store.similarity_search_by_vector(
+            query_vector,
+            k=TOP_K_RESULTS
         )
     except Exception as e:
-        error_message = f"Error initializing OpenAIEmbeddings: {e}"
+        error_message = f"Error during similarity search with Pinecone: {e}"
         print(error_message)
         return {"status": "error", "message": error_message, "retrieved_context": ""}
 
-    print(f"Connecting to Pinecone index '{pinecone_index_name}'...")
+    if not retrieved_docs:
+        if _DEBUG:
+            print("No relevant documents found in Pinecone for the query.")
+        _context_cache.put(user_query, "")
+        return {"status": "success", "message": _NO_MATCH_MESSAGE, "retrieved_context": ""}
+
+    if _DEBUG:
+        print(f"Retrieved {len(retrieved_docs)} documents from Pinecone.")
+    formatted_chunks_string = _format_context(retrieved_docs)
+    _context_cache.put(user_query, formatted_chunks_string)
+
+    if _DEBUG:
+        print("Successfully retrieved and formatted context from Pinecone.")
+    return _context_result(formatted_chunks_string)
+
+def query_knowledge_base_batch(queries: list[str]) -> list[dict]:
+    """
+    Batched variant of query_knowledge_base for multi-query flows (e.g. question decomposition).
+    Embeds all uncached queries in a single embeddings call and runs the Pinecone searches concurrently.
+    Args:
+        queries (list[str]): The queries to search for in the knowledge base.
+    Returns:
+        list[dict]: One result per query, in the same order and format as query_knowledge_base.
+    """
+    if _DEBUG:
+        print(f"Received batch of {len(queries)} queries for Pinecone.")
+    results = [None] * len(queries)
+
+    pending = []
+    for i, query in enumerate(queries):
+        cached_context = _context_cache.get(query)
+        if cached_context is not None:
+            results[i] = _context_result(cached_context)
+        else:
+            pending.append(i)
+
+    if not pending:
+        if _DEBUG:
+            print("All queries served from cache.")
+        return results
+
     try:
-        # PineconeVectorStore typically uses PINECONE_API_KEY and PINECONE_ENVIRONMENT 
-        # from environment variables if not passed directly.
-        vector_store = PineconeVectorStore.from_existing_index(
-            index_name=pinecone_index_name,
-            embedding=embeddings
-        )
-        print("Successfully connected to Pinecone index.")
+        vector_store = _get_vector_store()
+        query_vectors = get_cached_embedder().embed_queries([queries[i] for i in pending])
     except Exception as e:
-        error_message = f"Error connecting to Pinecone index '{pinecone_index_name}': {e}"
+        error_message = f"Error preparing batch search with Pinecone: {e}"
+        print(error_message)
+        for i in pending:
+            results[i] = {"status": "error", "message": error_message, "retrieved_context": ""}
+        return results
+
+    if _DEBUG:
+        print(f"Performing {len(pending)} similarity searches in Pinecone concurrently...")
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(vector_store.similarity_search_by_vector, query_vector, k=TOP_K_RESULTS)
+            for query_vector in query_vectors
+        ]
+
+    for i, future in zip(pending, futures):
+        try:
+            retrieved_docs = future.result()
+        except Exception as e:
+            error_message = f"Error during similarity search with Pinecone: {e}"
+            print(error_message)
+            results[i] = {"status": "error", "message": error_message, "retrieved_context": ""}
+            continue
+        formatted_chunks_string = _format_context(retrieved_docs)
+        _context_cache.put(queries[i], formatted_chunks_string)
+        results[i] = _context_result(formatted_chunks_string)
+
+    return results
+
+async def query_knowledge_base_async(user_query: str) -> dict:
+    """
+    Async variant of query_knowledge_base for serving many concurrent users (e.g. a web server).
+    Queries the gRPC Pinecone index directly; blocking calls run in worker threads so the
+    event loop can keep many queries in flight over the shared connection.
+    Args:
+        user_query (str): The user's query or question to search for in the knowledge base.
+    Returns:
+        dict: Same format as query_knowledge_base.
+    """
+    cached_context = _context_cache.get(user_query)
+    if cached_context is not None:
+        return _context_result(cached_context)
+
+    try:
+        index = _get_pinecone_index()
+        embedder = get_cached_embedder()
+    except Exception as e:
+        error_message = f"Error connecting to Pinecone index: {e}"
         print(error_message)
-        print("Ensure PINECONE_API_KEY and PINECONE_ENVIRONMENT are correctly set in your .env file,")
-        print("and the index name matches an existing index in your Pinecone project.")
         return {"status": "error", "message": error_message, "retrieved_context": ""}
 
-    print(f"Performing similarity search in Pinecone for query: '{user_query}'")
     try:
-        retrieved_docs = vector_store.similarity_search(
-            query=user_query,
-            k=TOP_K_RESULTS
+        query_vector = await asyncio.to_thread(embedder.embed_query, user_query)
+        response = await asyncio.to_thread(
+            index.query,
+            vector=query_vector,
+            top_k=TOP_K_RESULTS,
+            include_metadata=True
         )
     except Exception as e:
         error_message = f"Error during similarity search with Pinecone: {e}"
         print(error_message)
         return {"status": "error", "message": error_message, "retrieved_context": ""}
 
-    if not retrieved_docs:
-        print("No relevant documents found in Pinecone for the query.")
-        return {"status": "success", "message": "No relevant information found in the knowledge base.", "retrieved_context": ""}
-
-    print(f"Retrieved {len(retrieved_docs)} documents from Pinecone.")
-    formatted_chunks_string = "\n\n---\n\n".join([doc.page_content for doc in retrieved_docs])
+    retrieved_docs = []
+    for match in response.matches:
+        metadata = dict(match.metadata or {})
+        retrieved_docs.append(Document(page_content=metadata.pop("text", ""), metadata=metadata))
 
-    print("Successfully retrieved and formatted context from Pinecone.")
-    return {"status": "success", "retrieved_context": formatted_chunks_string}
+    formatted_chunks_string = _format_context(retrieved_docs)
+    _context_cache.put(user_query, formatted_chunks_string)
+    return _context_result(formatted_chunks_string)
 
 if __name__ == '__main__':
     # This example usage block requires the environment variables to be set correctly
     # and a Pinecone index populated by ingest_cloud.py to exist.
+    # Run it as a module from the repository root so the relative imports resolve:
+    #   python -m auhdhd_rag_agent.retrieve_knowledge_tool
     print("Testing query_knowledge_base with Pinecone (ensure .env is set and index is populated)...")
     
     # Example: Load .env for direct script execution if not already loaded globally
@@ -112,6 +345,10 @@ if __name__ == '__main__':
     if result_pinecone.get('retrieved_context'):
         print(f"Retrieved Context:\n{result_pinecone['retrieved_context']}")
 
+    # Repeating the query should be served from the in-process cache.
+    query_knowledge_base(test_query_pinecone)
+    print(f"\nCache stats: {cache_stats()}")
+
     print("\n--- Test Finished ---")
     print("Important: For this test to work, ensure:")
     print("1. Your .env file in 'auhdhd_rag_agent' has OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENVIRONMENT, and PINECONE_INDEX_NAME.")